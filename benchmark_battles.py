@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+"""Battle Benchmark.
+
+Benchmarks the sequential PVP routine against the concurrent battle dispatch using a local stand-in
+for the CoinBrawl API with an injected latency, no request ever reaches the real site.
+"""
+
+import logging
+import getopt, sys
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from json import dumps
+from threading import Lock, Thread
+from time import sleep, time
+from urlparse import parse_qs
+
+from bot_logic import BotLogic, OUT_OF_TOKENS_MESSAGE
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+def usage():
+    print 'Usage: python ./benchmark_battles.py [-b, --battles <n>] [-t, --tokens <n>] [-l, --latency <ms>] [-c, --concurrency <n>]'
+    print '\nOptions:'
+    print '\n-h, --help\t prints this message.'
+    print '-b, --battles\t amount of available battles served, defaults to 20.'
+    print '-t, --tokens\t amount of tokens the stand-in player has, defaults to the amount of battles.'
+    print '-l, --latency\t latency injected in every battle request in milliseconds, defaults to 200.'
+    print '-c, --concurrency battles in flight for the concurrent dispatch, defaults to 4.'
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    """StandInServer.
+
+    A threaded HTTP server that mimics `/api/available_battles` and `/battles`, every battle consumes one
+    token and answers with the out of tokens message once they are gone.
+    """
+    daemon_threads = True
+
+    def __init__(self, battles, tokens, latency):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StandInHandler)
+        self.battles = battles
+        self.latency = latency
+        self.lock = Lock()
+        self.reset(tokens)
+
+    def reset(self, tokens):
+        """Restores the tokens and the request counter between runs."""
+        self.tokens = tokens
+        self.battle_requests = 0
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        # keep the benchmark output clean
+        pass
+
+    def send_json(self, payload):
+        body = dumps(payload)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/api/available_battles':
+            self.send_error(404)
+            return
+        battles = [{ 'key': 'arena', 'defender_username': 'player_%s' % i, 'defender_id': i, 'percentage_chance': '50%' }
+            for i in range(self.server.battles)]
+        self.send_json(battles)
+
+    def do_POST(self):
+        if self.path != '/battles':
+            self.send_error(404)
+            return
+        post_data = parse_qs(self.rfile.read(int(self.headers.getheader('Content-Length', 0))))
+        defender_id = post_data['battle[defender_id]'][0]
+        # the injected latency of the fight
+        sleep(self.server.latency)
+        with self.server.lock:
+            self.server.battle_requests += 1
+            if self.server.tokens <= 0:
+                self.send_json({ 'type': 'error', 'message': OUT_OF_TOKENS_MESSAGE })
+                return
+            self.server.tokens -= 1
+        self.send_json({ 'type': 'success', 'message': 'You defeated player_%s!' % defender_id })
+
+def run(label, server, tokens, func):
+    """Runs one of the routines against a fresh stand-in and prints the timing."""
+    server.reset(tokens)
+    start = time()
+    result = func()
+    elapsed = time() - start
+    print '%-12s %7.2fs  %3s battle requests  %s' % (label, elapsed, server.battle_requests, result)
+    return elapsed
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'hb:t:l:c:', ['help', 'battles=', 'tokens=', 'latency=', 'concurrency='])
+    except getopt.GetoptError as err:
+        print err
+        usage()
+        sys.exit(2)
+
+    battles = 20
+    tokens = None
+    latency = 200
+    concurrency = 4
+    for option, arg in opts:
+        if option in ('-h', '--help'):
+            usage()
+            sys.exit()
+        elif option in ('-b', '--battles'):
+            battles = int(arg)
+        elif option in ('-t', '--tokens'):
+            tokens = int(arg)
+        elif option in ('-l', '--latency'):
+            latency = int(arg)
+        elif option in ('-c', '--concurrency'):
+            concurrency = int(arg)
+    if tokens is None:
+        tokens = battles
+
+    server = StandInServer(battles, tokens, latency / 1000.0)
+    server_thread = Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    # point the bot to the stand-in, no auth is needed there, and use a fixed user agent
+    # so `fake_useragent` doesn't fetch its browser data either
+    coinBrawl = BotLogic('user@example.com', 'password', user_agent='coinbrawl-bot-benchmark')
+    coinBrawl.base_url = 'http://127.0.0.1:%s' % server.server_address[1]
+
+    print '%s battles, %s tokens, %sms latency\n' % (battles, tokens, latency)
+    sequential = run('sequential', server, tokens, lambda: coinBrawl.battle_players())
+
+    def dispatch():
+        coinBrawl.current_tokens = tokens
+        summary = coinBrawl.dispatch_battles(concurrency=concurrency)
+        sent = len([battle for battle in summary['results'] if battle['result'] is not None])
+        return '%s, %s results, %s cancelled' % (summary['status'], sent, summary['cancelled'])
+    concurrent = run('concurrent', server, tokens, dispatch)
+
+    print '\nspeedup: %.2fx with %s battles in flight' % (sequential / concurrent, concurrency)
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
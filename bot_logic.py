@@ -5,21 +5,27 @@ Provides all the logic for the routines and requests related to the bot.
 """
 
 import logging
+import sys
 from re import search, findall
 from json import loads
 from string import replace
+from threading import Event, Lock, Thread
+from Queue import Queue, Empty
 from encore import Encore
 
 logger = logging.getLogger(__name__)
 
+# the message the `/battles` endpoint answers with once our PVP tokens are gone
+OUT_OF_TOKENS_MESSAGE = 'Sorry, you are out of tokens! You can get more tokens on the \'Character\' page.'
+
 class BotLogic():
     """BotLogic.
 
     A class to handle the bot logic.
     """
-    def __init__(self, user, password):
-        # initialize the HTTP class
-        self.encore = Encore()
+    def __init__(self, user, password, user_agent=None):
+        # initialize the HTTP class, a random user agent is used if none is given
+        self.encore = Encore(user_agent=user_agent)
         # the site's url
         self.base_url = self.encore.base_url
         # user credentials
@@ -76,6 +82,9 @@ class BotLogic():
             friendly_tokens (number): Current amount of tokens, this are PVP tokens and allow to
                 engage another players, one token is consumed by battle.
 
+            current_tokens (int): The `current_amount` part of the tokens stat, used as the token
+                budget when dispatching PVP battles concurrently.
+
             Note:
                 Must be run once every cycle since the attributes above are necessary for the upgrade
                 and farm functions.
@@ -89,6 +98,7 @@ class BotLogic():
         # the response looks like `current_amount/limit` being both, current amount and limit, numbers
         self.friendly_stamina = stats_json['friendly_stamina'].split('/')[1]
         self.friendly_tokens = stats_json['friendly_tokens'].split('/')[1]
+        self.current_tokens = int(stats_json['friendly_tokens'].split('/')[0])
         self.gold = stats_json['gold']
 
     def reset_stamina(self):
@@ -246,12 +256,14 @@ class BotLogic():
             logger.info('Could not upgrade defese something went wrong...')
             return { 'status': 'error', 'response': response }
 
-    def battle_players(self, above_win_rate=False, win_rate=None):
+    def battle_players(self, above_win_rate=False, win_rate=None, concurrency=1):
         """Engages in battle with another player.
 
         Args:
             above_win_rate (bool): only fight players that we have with certain amount of winning.
             win_rate (int): if `above_win_rate` is True, this will be the minimun win_rate required to be challenged.
+            concurrency (int, optional): if greater than 1 the battles are dispatched through `dispatch_battles`
+                with this many requests in flight, defaults to 1 (one battle at a time).
 
         Returns:
             `False` if there are no more tokens, True if everything (beside the fight results) went fine.
@@ -263,6 +275,9 @@ class BotLogic():
         if (above_win_rate and win_rate == None):
             raise ValueError('You must specify a win percentage if the `above_win_rate` flag is True')
 
+        if concurrency > 1:
+            return self.dispatch_battles(concurrency=concurrency)['status'] != 'out_of_tokens'
+
         available_battles = self.encore.get(self.base_url + '/api/available_battles').json()
         logger.info('Fighting players...')
         for battle in available_battles:
@@ -282,11 +297,119 @@ class BotLogic():
             # should handle the win rate or something else here <--
 
             # if we run out of tokens we should false the return here
-            if battle_result['message'] == 'Sorry, you are out of tokens! You can get more tokens on the \'Character\' page.':
+            if battle_result['message'] == OUT_OF_TOKENS_MESSAGE:
                 return False
 
         return True
 
+    def dispatch_battles(self, concurrency=3, tokens=None):
+        """Engages in battle with all the available players, several battles at a time.
+
+        The battles are posted through the shared session by `concurrency` worker threads, so the latency of
+        one fight no longer adds up to the next one. Every battle consumes one token from the known budget
+        (`tokens`, or `current_tokens` if `get_stats` has been run), once it's spent or any response says
+        we are out of tokens, the battles still queued are cancelled instead of being sent.
+
+        Args:
+            concurrency (int, optional): The maximum amount of battle requests in flight, defaults to 3.
+            tokens (int, optional): The known amount of tokens, defaults to `current_tokens` if available,
+                otherwise the budget is unknown and we rely on the server telling us when we run out.
+
+        Returns:
+            Returns a dictionary with the status, the results and the amount of cancelled battles:
+                `success`: Every available battle was sent.
+                `out_of_tokens`: We ran out of tokens, the remaining battles were cancelled.
+            `results` holds one `{ 'defender_id': ..., 'result': ... }` entry per battle in the same order as
+            `/api/available_battles`, `result` is the `battle_result` payload or `None` if it was cancelled.
+
+        Raises:
+            The first exception raised while sending a battle (e.g. `NetworkError`), the battles still queued
+            are cancelled in that case, just like the sequential routine would stop.
+
+        """
+        if concurrency < 1:
+            raise ValueError('The `concurrency` must be at least 1')
+
+        if tokens is None:
+            tokens = getattr(self, 'current_tokens', None)
+
+        available_battles = self.encore.get(self.base_url + '/api/available_battles').json()
+        logger.info('Fighting %s players, %s at a time...', len(available_battles), concurrency)
+
+        # one slot per battle so the summary keeps the original order
+        results = [{ 'defender_id': battle['defender_id'], 'result': None } for battle in available_battles]
+        # the shared token budget, guarded by the lock
+        budget = { 'tokens': tokens, 'cancelled': 0 }
+        lock = Lock()
+        out_of_tokens = Event()
+        # the exceptions raised in the workers, re-raised once they are done
+        errors = []
+
+        queue = Queue()
+        for index, battle in enumerate(available_battles):
+            queue.put((index, battle))
+
+        def reserve_token():
+            # take a token from the budget, `False` means the battle must be cancelled
+            with lock:
+                if out_of_tokens.is_set() or errors or budget['tokens'] == 0:
+                    budget['cancelled'] += 1
+                    return False
+                if budget['tokens'] is not None:
+                    budget['tokens'] -= 1
+                return True
+
+        def worker():
+            while True:
+                try:
+                    index, battle = queue.get_nowait()
+                except Empty:
+                    return
+
+                if not reserve_token():
+                    continue
+
+                try:
+                    post_data = { 'battle[defender_id]'	: battle['defender_id'], 'token' : battle['key'] }
+                    logger.debug('Sending battle request against %s...', battle['defender_username'])
+                    battle_result = self.encore.post(self.base_url + '/battles', data=post_data).json()
+                    results[index]['result'] = battle_result
+
+                    if battle_result['message'] == OUT_OF_TOKENS_MESSAGE:
+                        logger.info('Out of tokens, cancelling the queued battles...')
+                        out_of_tokens.set()
+                except:
+                    logger.error('Battle against %s failed, cancelling the queued battles...', battle.get('defender_username'), exc_info=True)
+                    with lock:
+                        errors.append(sys.exc_info())
+
+        workers = [Thread(target=worker) for _ in range(min(concurrency, len(available_battles)))]
+        for thread in workers:
+            thread.daemon = True
+            thread.start()
+        for thread in workers:
+            # an untimed join can't be interrupted by ctrl-c on python 2
+            while thread.is_alive():
+                thread.join(0.5)
+
+        # anything left in the queue was never sent
+        budget['cancelled'] += queue.qsize()
+
+        # keep our known token count in sync with what we have spent
+        if out_of_tokens.is_set():
+            self.current_tokens = 0
+        elif budget['tokens'] is not None:
+            self.current_tokens = budget['tokens']
+
+        if errors:
+            # same as the sequential routine, let the caller know about the failure
+            exc_type, exc_value, exc_traceback = errors[0]
+            raise exc_type, exc_value, exc_traceback
+
+        status = 'out_of_tokens' if out_of_tokens.is_set() or budget['cancelled'] else 'success'
+        logger.info('Dispatched %s battles, %s cancelled...', len(available_battles) - budget['cancelled'], budget['cancelled'])
+        return { 'status': status, 'results': results, 'cancelled': budget['cancelled'] }
+
     def battle_npc(self, id=0):
         """Engages in battle with an NPC.
 
@@ -17,6 +17,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 npc_id = 0
+pvp_concurrency = 1
 
 def usage():
     print 'Usage: python ./coinbrawl_bot.py -h, --help | -f, --farm-stats <stamina | tokens | attack | defense> | -p, --pvp <win_percentage>'
@@ -47,6 +48,10 @@ def setup_robot():
     password = config.get('Credentials', 'password')
     global npc_id
     npc_id = config.get('NPC', 'id')
+    # how many PVP battles are sent at a time, older configs may not have it
+    global pvp_concurrency
+    if config.has_option('PVP', 'concurrency'):
+        pvp_concurrency = config.getint('PVP', 'concurrency')
 
     coinBrawl = BotLogic(user, password)
     coinBrawl.auth()
@@ -124,13 +129,15 @@ def main():
                     sleep(5/10)
         elif option in ('-p', '--pvp'):
             # setup the bot instance
-            CoinBrawl = setup_robot()
+            coinBrawl = setup_robot()
             # Todo:
             #   * The argument is not optional by default (getopt)
             if arg is not None: above_win_rate = True
             while True:
+                # refresh the stats so the token budget is current every cycle
+                coinBrawl.get_stats()
                 # farm player non-stop
-                if not coinBrawl.battle_players(above_win_rate=above_win_rate, win_rate=arg):
+                if not coinBrawl.battle_players(above_win_rate=above_win_rate, win_rate=arg, concurrency=pvp_concurrency):
                     # untested, but should break (return false) when we run out of tokens
                     break
                 # 6 https requests per batch, throttle it a little
@@ -23,13 +23,14 @@ class Encore():
         * Should check for the 302 URL and relog if its sig_in https://stackoverflow.com/questions/20475552/python-requests-library-redirect-new-url
 
     """
-    def __init__(self):
-        # grab a random user agent for the requests
-        user_agent = UserAgent()
+    def __init__(self, user_agent=None):
+        # grab a random user agent for the requests unless we were given one
+        if user_agent is None:
+            user_agent = UserAgent().random
         # initialize the session for the cookie handling
         self.session = Session()
         # initialize the default headers with the agent
-        self.session.headers.update({ 'User-Agent': user_agent.random })
+        self.session.headers.update({ 'User-Agent': user_agent })
         # site root
         self.base_url = 'https://www.coinbrawl.com'
 